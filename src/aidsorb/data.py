@@ -21,14 +21,22 @@ handling point clouds of variable sizes.
 
 import os
 import json
+import mmap
+import struct
+import zipfile
 from pathlib import Path
 from typing import Sequence
 import numpy as np
 import torch
-from torch.utils.data import random_split, Dataset
+from torch.utils.data import random_split, Dataset, Sampler
 from torch.nn.utils.rnn import pad_sequence
 from . _internal import _SEED, pd
 
+try:  # Optional dependency, for faster parsing of large name lists.
+    import orjson
+except ImportError:
+    orjson = None
+
 
 def prepare_data(source: str, split_ratio: Sequence=(0.8, 0.1, 0.1), seed: int=_SEED):
     r"""
@@ -91,6 +99,110 @@ def prepare_data(source: str, split_ratio: Sequence=(0.8, 0.1, 0.1), seed: int=_
     print('\033[32mData preparation completed!\033[0m')
 
 
+def _flat_filenames(source):
+    r"""
+    Return the filenames of the flat copy of ``source``.
+
+    Parameters
+    ----------
+    source : str
+        Absolute or relative path to the ``.npz`` file.
+
+    Returns
+    -------
+    filenames : tuple of length 3
+        * ``filenames[0]`` holds the flat array of point clouds.
+        * ``filenames[1]`` holds the offsets array.
+        * ``filenames[2]`` holds the names of the point clouds.
+    """
+    path = Path(source)
+
+    return (
+            str(path.with_name(f'{path.stem}_flat.npy')),
+            str(path.with_name(f'{path.stem}_offsets.npy')),
+            str(path.with_name(f'{path.stem}_names.json')),
+            )
+
+
+def _flat_is_fresh(source):
+    r"""
+    Return whether the flat copy of ``source`` exists and is up to date.
+
+    A flat copy older than ``source`` is stale (e.g. the archive was
+    regenerated) and must not be used.
+
+    Parameters
+    ----------
+    source : str
+        Absolute or relative path to the ``.npz`` file.
+
+    Returns
+    -------
+    bool
+    """
+    path_to_flat, _, _ = _flat_filenames(source)
+
+    return (
+            os.path.exists(path_to_flat)
+            and os.path.getmtime(path_to_flat) >= os.path.getmtime(source)
+            )
+
+
+def flatten_npz(source):
+    r"""
+    Convert a source of point clouds into a single contiguous array.
+
+    The point clouds are concatenated into one flat array of shape
+    ``(sum(N_i), C)`` which is stored in ``.npy`` format, alongside a
+    CSR-style ``offsets`` array of shape ``(num_samples + 1,)`` and the list
+    of names. The point cloud ``names[i]`` is then
+    ``flat[offsets[i]:offsets[i + 1]]``.
+
+    Unlike the ``.npz`` archive, the flat copy can be memory-mapped and read
+    sequentially, with no per-sample parsing or decompression. It is picked up
+    automatically by :class:`PCDDataset`.
+
+    Parameters
+    ----------
+    source : str
+        Absolute or relative path to the ``.npz`` file holding the point
+        clouds.
+
+    Examples
+    --------
+    Before the conversion::
+
+        pcd_data
+        └──pcds.npz
+
+    >>> flatten_npz('path/to/pcd_data/pcds.npz')  # doctest: +SKIP
+
+    After the conversion::
+
+        pcd_data
+        ├──pcds.npz
+        ├──pcds_flat.npy
+        ├──pcds_offsets.npy
+        └──pcds_names.json
+    """
+    path_to_flat, path_to_offsets, path_to_names = _flat_filenames(source)
+
+    pcds = np.load(source)
+    names = pcds.files
+    arrays = [pcds[name] for name in names]
+
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(arr) for arr in arrays], out=offsets[1:])
+
+    np.save(path_to_flat, np.concatenate(arrays))
+    np.save(path_to_offsets, offsets)
+
+    with open(path_to_names, 'w') as fhand:
+        json.dump(names, fhand, indent=4)
+
+    print('\033[32mFlattening completed!\033[0m')
+
+
 def get_names(filename):
     r"""
     Return names stored in a ``.json`` file.
@@ -103,13 +215,81 @@ def get_names(filename):
     Returns
     -------
     names : list
+
+    Notes
+    -----
+    If `orjson`_ is installed, it is used for parsing, which is considerably
+    faster on large files. Install it with ``pip install aidsorb[fast]``.
+
+    .. _orjson: https://github.com/ijl/orjson
     """
+    if orjson is not None:
+        with open(filename, 'rb') as fhand:
+            return orjson.loads(fhand.read())
+
     with open(filename, 'r') as fhand:
         names = json.load(fhand)
 
     return names
 
 
+def build_npz_index(path_to_X):
+    r"""
+    Index the ``.npy`` members of an uncompressed ``.npz`` file.
+
+    The index maps each name stored in the ``.npz`` file to the ``(offset,
+    shape, dtype)`` of the raw array data inside the archive. Arrays can then
+    be read directly from a memory-map of the archive, without re-parsing the
+    archive and without copying any data.
+
+    .. note::
+        Only uncompressed archives (see :func:`numpy.savez`) can be indexed,
+        since the array data inside compressed archives (see
+        :func:`numpy.savez_compressed`) are not memory-mappable.
+
+    Parameters
+    ----------
+    path_to_X : str
+        Absolute or relative path to the ``.npz`` file.
+
+    Returns
+    -------
+    index : dict or None
+        Dictionary with names as keys and ``(offset, shape, dtype)`` as
+        values, or ``None`` if the archive can't be indexed.
+    """
+    read_header = {
+            (1, 0): np.lib.format.read_array_header_1_0,
+            (2, 0): np.lib.format.read_array_header_2_0,
+            }
+
+    index = {}
+
+    with zipfile.ZipFile(path_to_X) as npz, open(path_to_X, 'rb') as fhand:
+        for info in npz.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                return None
+
+            # Skip the local file header of the member.
+            fhand.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack('<HH', fhand.read(4))
+            fhand.seek(info.header_offset + 30 + name_len + extra_len)
+
+            # Parse the .npy header of the member.
+            version = np.lib.format.read_magic(fhand)
+            if version not in read_header:
+                return None
+
+            shape, fortran_order, dtype = read_header[version](fhand)
+            if fortran_order:
+                return None
+
+            name = info.filename.removesuffix('.npy')
+            index[name] = (fhand.tell(), shape, dtype)
+
+    return index
+
+
 def upsample_pcd(pcd, size):
     r"""
     Upsample ``pcd`` to a new ``size`` by sampling with replacement from ``pcd``.
@@ -355,6 +535,194 @@ class Collator():
         return x, y
 
 
+def _identity_collate(samples):
+    r"""Return ``samples`` unchanged. Used for micro-batch dataloaders."""
+    return samples
+
+
+class MicroBatchLoader():
+    r"""
+    Iterable that re-assembles micro-batches into full batches.
+
+    PyTorch assigns each batch to a *single* worker: the first batch of an
+    epoch is produced sequentially while the other workers idle, and a
+    straggler worker stalls the consumer for a whole batch. Wrapping a
+    dataloader that yields small *micro-batches* (ideally ``batch_size //
+    num_workers`` samples each) spreads every full batch across all workers,
+    while ``collate_fn`` still sees full batches.
+
+    .. note::
+        The wrapped ``dataloader`` must yield *lists of samples*, i.e. use an
+        identity ``collate_fn``.
+
+    Parameters
+    ----------
+    dataloader : iterable
+        Dataloader yielding lists of samples.
+    batch_size : int
+        Size of the re-assembled batches.
+    collate_fn : callable
+        Collate function applied to each re-assembled batch.
+    drop_last : bool, default=False
+        Whether to drop the last incomplete batch.
+
+    Examples
+    --------
+    >>> from torch.utils.data import DataLoader
+    >>> ds = [(torch.full((3, 4), i), torch.tensor([i])) for i in range(10)]
+    >>> micro = DataLoader(ds, batch_size=2, collate_fn=_identity_collate)
+    >>> loader = MicroBatchLoader(micro, batch_size=4, collate_fn=Collator())
+    >>> len(loader)
+    3
+    >>> [x.shape[0] for x, y in loader]
+    [4, 4, 2]
+    """
+    def __init__(self, dataloader, batch_size, collate_fn, drop_last=False):
+        self.dataloader = dataloader
+        self.batch_size = batch_size
+        self.collate_fn = collate_fn
+        self.drop_last = drop_last
+
+    def __len__(self):
+        n_samples = len(self.dataloader.dataset)
+
+        if self.drop_last:
+            return n_samples // self.batch_size
+
+        return -(-n_samples // self.batch_size)  # Ceiling division.
+
+    def __iter__(self):
+        buffer = []
+
+        for micro_batch in self.dataloader:
+            buffer.extend(micro_batch)
+
+            while len(buffer) >= self.batch_size:
+                yield self.collate_fn(buffer[:self.batch_size])
+                buffer = buffer[self.batch_size:]
+
+        if buffer and not self.drop_last:
+            yield self.collate_fn(buffer)
+
+
+class PermutationSampler(Sampler):
+    r"""
+    Sampler yielding a fresh random permutation of indices on each epoch.
+
+    Unlike :class:`~torch.utils.data.RandomSampler`, the permutation is drawn
+    *in-place* into a persistent, preallocated index tensor, so epochs don't
+    pay a per-epoch ``O(N)`` allocation and no Python list of indices is ever
+    materialized.
+
+    Parameters
+    ----------
+    data_source : sized
+        The dataset (or anything with a length) to sample from.
+    seed : int, optional
+        Controls the randomness of the permutations. With the default
+        ``None``, the global RNG is used, so the shuffle order responds to
+        :func:`torch.manual_seed` and
+        :func:`~lightning.fabric.utilities.seed.seed_everything`.
+
+    Examples
+    --------
+    >>> sampler = PermutationSampler(range(10))
+    >>> len(sampler)
+    10
+
+    >>> epoch1 = torch.stack(list(sampler))
+    >>> epoch2 = torch.stack(list(sampler))
+
+    >>> torch.equal(epoch1.sort()[0], epoch2.sort()[0])  # Same indices.
+    True
+    >>> torch.equal(epoch1, epoch2)  # Different order.
+    False
+    """
+    def __init__(self, data_source, seed=None):
+        self._perm = torch.empty(len(data_source), dtype=torch.int64)
+
+        # With seed=None, torch.randperm falls back to the global RNG.
+        self._generator = None
+        if seed is not None:
+            self._generator = torch.Generator().manual_seed(seed)
+
+    def __len__(self):
+        return len(self._perm)
+
+    def __iter__(self):
+        # Reshuffle in-place, so no per-epoch allocation takes place.
+        torch.randperm(
+                len(self._perm),
+                generator=self._generator,
+                out=self._perm,
+                )
+
+        return iter(self._perm)
+
+
+class PCDStore():
+    r"""
+    In-RAM store of point clouds backed by shared-memory tensors.
+
+    The whole corpus is held as one contiguous tensor plus a CSR-style
+    offsets tensor (the layout of :func:`flatten_npz`), both moved to shared
+    memory. Dataloader workers inherit the same pages and read them
+    *zero-copy*, so throughput keeps scaling with ``num_workers`` instead of
+    plateauing on per-worker deserialization.
+
+    .. note::
+        The entire corpus must fit in RAM. If many workers exhaust file
+        descriptors, use
+        ``torch.multiprocessing.set_sharing_strategy('file_system')``.
+
+    Parameters
+    ----------
+    path_to_X : str
+        Absolute or relative path to the ``.npz`` file holding the point
+        clouds. The flat copy (see :func:`flatten_npz`) is used when present;
+        otherwise, the archive is read once.
+
+    See Also
+    --------
+    :func:`flatten_npz` : For the underlying flat layout.
+    """
+    def __init__(self, path_to_X):
+        path_to_flat, path_to_offsets, path_to_names = _flat_filenames(path_to_X)
+
+        if _flat_is_fresh(path_to_X):
+            pcds = torch.from_numpy(np.load(path_to_flat))
+            offsets = torch.from_numpy(np.load(path_to_offsets))
+            names = get_names(path_to_names)
+        else:
+            data = np.load(path_to_X)
+            names = data.files
+            arrays = [data[name] for name in names]
+
+            offsets = torch.zeros(len(names) + 1, dtype=torch.int64)
+            torch.cumsum(
+                    torch.tensor([len(arr) for arr in arrays]),
+                    dim=0, out=offsets[1:],
+                    )
+            pcds = torch.from_numpy(np.concatenate(arrays))
+
+        self._pcds = pcds.share_memory_()
+        self._offsets = offsets.share_memory_()
+        self._slots = {name: i for i, name in enumerate(names)}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __getitem__(self, name):
+        i = self._slots[name]
+
+        # Zero-copy view of the shared-memory tensor. Mark it read-only, so
+        # an in-place transform can't corrupt the corpus for all workers.
+        view = self._pcds[self._offsets[i]:self._offsets[i + 1]].numpy()
+        view.flags.writeable = False
+
+        return view
+
+
 class PCDDataset(Dataset):
     r"""
     ``Dataset`` for point clouds.
@@ -390,6 +758,31 @@ class PCDDataset(Dataset):
         Transforms applied to ``input``, i.e to each point cloud.
     transform_y : callable, optional
         Transforms applied to ``output``. No effect if ``path_to_Y=None``.
+    index : dict, optional
+        Index of the ``.npz`` file, as returned by :func:`build_npz_index`. If
+        ``None``, the index is built during instantiation. Mainly useful for
+        sharing a prebuilt index across datasets.
+    dtype : :class:`torch.dtype`, default=torch.float
+        The dtype of the returned point clouds. Passing ``torch.bfloat16``
+        halves the bytes per point moved through RAM and over PCIe; atomic
+        numbers (``Z <= 118``) are exactly representable in ``bfloat16``.
+        Upcast once per batch at model entry.
+    store : :class:`PCDStore`, optional
+        Preloaded in-RAM store of the point clouds. If given, it takes
+        precedence over all file-backed storage and ``path_to_X`` is not
+        touched.
+
+    Notes
+    -----
+    The point clouds are read from the fastest available storage:
+
+    1. A flat copy created with :func:`flatten_npz`, if present alongside
+       ``path_to_X``, which is memory-mapped and read sequentially.
+    2. A memory-map of the ``.npz`` archive itself, if uncompressed.
+    3. The ``.npz`` archive through :func:`numpy.load`, where access to each
+       point cloud pays the cost of decompression.
+
+    In all cases, the storage is opened *once per dataloader worker*.
 
     See Also
     --------
@@ -399,6 +792,7 @@ class PCDDataset(Dataset):
             self, pcd_names, path_to_X,
             path_to_Y=None, index_col=None, labels=None,
             transform_x=None, transform_y=None,
+            index=None, dtype=torch.float, store=None,
             ):
 
         if (labels is not None) and (type(labels) != list):
@@ -411,6 +805,20 @@ class PCDDataset(Dataset):
         self.index_col = index_col
         self.transform_x = transform_x
         self.transform_y = transform_y
+        self.dtype = dtype
+        self.store = store
+
+        # Prefer the flat copy of the point clouds, if available and fresh.
+        self._path_to_flat = None
+        if store is None and _flat_is_fresh(path_to_X):
+            path_to_flat, path_to_offsets, path_to_flat_names = _flat_filenames(path_to_X)
+            self._path_to_flat = path_to_flat
+            self._offsets = np.load(path_to_offsets)
+            self._slots = {n: i for i, n in enumerate(get_names(path_to_flat_names))}
+
+        if index is None and store is None and self._path_to_flat is None:
+            index = build_npz_index(path_to_X)
+        self.index = index
 
         self.X = None
         self.Y = None
@@ -423,33 +831,123 @@ class PCDDataset(Dataset):
     def __len__(self):
         return len(self.pcd_names)
 
-    def __getitem__(self, idx):
-        # Account for np.load and multiprocessing.
-        if self.X is None:
+    def _init_X(self):
+        r"""
+        Initialize access to the point clouds.
+
+        Called on first access and not in ``__init__``, so each dataloader
+        worker opens its own handle/memory-map.
+        """
+        if self._path_to_flat is not None:
+            self.X = np.load(self._path_to_flat, mmap_mode='r')
+        elif self.index is not None:
+            with open(self.path_to_X, 'rb') as fhand:
+                self.X = mmap.mmap(fhand.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
             self.X = np.load(self.path_to_X)
+
+    def _init_Y(self):
+        r"""
+        Initialize access to the labels.
+
+        The labels are materialized as an array whose rows are aligned with
+        ``pcd_names``, so per-sample access is plain ``O(1)`` indexing with no
+        pandas lookup in the hot loop.
+
+        Called on first access and not in ``__init__``, so each dataloader
+        worker holds its own copy.
+        """
+        df = pd.read_csv(
+                self.path_to_Y,
+                index_col=self.index_col,
+                usecols=[*self.labels, self.index_col],
+                )
+
+        self.Y = df.loc[list(self.pcd_names)].to_numpy()
+
+    def _get_pcd(self, name):
+        r"""Return the point cloud ``name`` as an array."""
+        if self.store is not None:
+            return self.store[name]
+
+        if self._path_to_flat is not None:
+            i = self._slots[name]
+            return self.X[self._offsets[i]:self._offsets[i + 1]]
+
+        if self.index is not None:
+            offset, shape, dtype = self.index[name]
+            count = int(np.prod(shape))
+
+            return np.frombuffer(
+                    self.X, dtype=dtype,
+                    count=count, offset=offset,
+                    ).reshape(shape)
+
+        return self.X[name]
+
+    def __getitems__(self, indices):
+        r"""
+        Return the list of samples for a batch of ``indices``.
+
+        Picked up automatically by :class:`~torch.utils.data.DataLoader`
+        instead of one :meth:`__getitem__` call per sample, so Python-level
+        overhead (lazy-init checks, label lookups) is amortized across the
+        batch. The returned samples are identical to
+        ``[self[i] for i in indices]``.
+        """
+        # Account for multiprocessing.
+        if self.X is None and self.store is None:
+            self._init_X()
         if self.Y is None and self.path_to_Y is not None:
-            self.Y = pd.read_csv(
-                    self.path_to_Y,
-                    index_col=self.index_col,
-                    usecols=[*self.labels, self.index_col],
-                    )
+            self._init_Y()
+
+        names = [self.pcd_names[i] for i in indices]
+        xs = [self._get_pcd(name) for name in names]
+
+        if self.transform_x is not None:
+            xs = [self.transform_x(x) for x in xs]
+
+        # Only for labeled datasets.
+        if self.Y is not None:
+            # One gather instead of one lookup per sample.
+            ys = self.Y[np.fromiter(indices, dtype=np.int64)]
+
+            if self.transform_y is not None:
+                ys = [self.transform_y(y) for y in ys]
+
+            return [
+                    (
+                        torch.tensor(x, dtype=self.dtype),
+                        torch.tensor(y, dtype=torch.float),
+                        )
+                    for x, y in zip(xs, ys)
+                    ]
+
+        return [torch.tensor(x, dtype=self.dtype) for x in xs]
+
+    def __getitem__(self, idx):
+        # Account for multiprocessing.
+        if self.X is None and self.store is None:
+            self._init_X()
+        if self.Y is None and self.path_to_Y is not None:
+            self._init_Y()
 
         name = self.pcd_names[idx]
-        sample_x = self.X[name]
+        sample_x = self._get_pcd(name)
 
         if self.transform_x is not None:
             sample_x = self.transform_x(sample_x)
 
         # Only for labeled datasets.
         if self.Y is not None:
-            sample_y = self.Y.loc[name].to_numpy()
+            sample_y = self.Y[idx]
 
             if self.transform_y is not None:
                 sample_y = self.transform_y(sample_y)
 
             return (
-                    torch.tensor(sample_x, dtype=torch.float),
+                    torch.tensor(sample_x, dtype=self.dtype),
                     torch.tensor(sample_y, dtype=torch.float)
                     )
 
-        return torch.tensor(sample_x, dtype=torch.float)
+        return torch.tensor(sample_x, dtype=self.dtype)
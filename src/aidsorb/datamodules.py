@@ -22,9 +22,14 @@ use with |lightning|.
 import os
 from typing import Callable
 from pathlib import Path
+import torch
 import lightning as L
 from torch.utils.data import DataLoader
-from . data import get_names, PCDDataset
+from . data import (
+        get_names, build_npz_index, flatten_npz,
+        _flat_is_fresh, _identity_collate, Collator,
+        MicroBatchLoader, PCDDataset, PCDStore, PermutationSampler,
+        )
 
 
 class PCDDataModule(L.LightningDataModule):
@@ -44,10 +49,6 @@ class PCDDataModule(L.LightningDataModule):
         Assuming ``pcd_data/pcds.npz`` already exists, you can create the above
         directory structure with :func:`~aidsorb.data.prepare_data`.
 
-    .. todo::
-        * Add support for ``predict_dataloader``.
-        * Add option ``drop_last`` for ``train_dataloader``.
-
     Parameters
     ----------
     path_to_X : str
@@ -71,20 +72,94 @@ class PCDDataModule(L.LightningDataModule):
         used.
     train_transform_x : callable, optional
         Transforms applied to ``input`` during training.
+    train_transform_batch : callable, optional
+        Transforms applied to the *batched* ``input`` of shape ``(B, C, T)``
+        during training, after the batch has been moved to the training
+        device. Prefer this over ``train_transform_x`` for cheap geometric
+        augmentations (e.g. rotation, jitter): they run on the device over
+        the whole batch, off the CPU critical path that prefetching can't
+        hide.
     eval_transform_x : callable, optional
         Transforms applied to ``input`` during validation and testing.
     transform_y : callable, optional
         Transforms applied to ``output``.
+    dtype : :class:`torch.dtype`, default=torch.float
+        The dtype of the point clouds served by the dataloaders. Passing
+        ``torch.bfloat16`` halves the dataloading bandwidth; see
+        :class:`~aidsorb.data.PCDDataset`.
     shuffle : bool, default=False
         Only for ``train_dataloader``.
+    seed : int, optional
+        Controls the shuffle order of ``train_dataloader``. With the default
+        ``None``, the global RNG is used, so the order responds to
+        :func:`~lightning.fabric.utilities.seed.seed_everything`. If an
+        ``int``, the order is fixed across runs; under ``shard_by_rank``,
+        each rank shuffles its local shard with ``seed + global_rank``. No
+        effect if ``shuffle=False``.
+    drop_last : bool, default=True
+        Whether the train dataloader should drop the last incomplete batch.
+        Fixed-size batches keep tensor shapes static, so a
+        :func:`torch.compile`'d model doesn't recompile on the ragged final
+        batch of each epoch. Only for ``train_dataloader``.
+    shard_by_rank : bool, default=False
+        Whether to shard the names under DDP, so each rank holds and loads
+        only ``1 / world_size`` of each name list. Each rank shuffles its
+        local shard with a rank-dependent seed. No effect if ``world_size=1``.
+
+        .. warning::
+            If ``shard_by_rank=True``, you must pass
+            ``use_distributed_sampler=False`` to the
+            :class:`~lightning.pytorch.trainer.trainer.Trainer`, otherwise the
+            shards are sharded again by ``DistributedSampler``.
     train_batch_size : int, default=32
         ``batch_size`` for train dataloader.
     eval_batch_size : int, default=32
         ``batch_size`` for the validation and test dataloaders.
+    num_workers : int, default=(os.cpu_count() or 2) // 2
+        Number of subprocesses used by all dataloaders. With
+        ``num_workers > 0``, loading and transforming point clouds overlaps
+        with the training step.
+    pin_memory : bool, default=True
+        Whether the dataloaders should copy tensors into pinned memory, for
+        faster host-to-device transfers. If CUDA is available, memory is
+        pinned for the local device via ``pin_memory_device``.
+    persistent_workers : bool, default=True
+        Whether the worker processes should stay alive across epochs. Keeping
+        them alive avoids the per-epoch worker startup (fork + dataset
+        transfer) and keeps per-worker dataset state, such as memory-maps and
+        the label array, resident across epochs. No effect if
+        ``num_workers=0``.
+    prefetch_factor : int, default=2
+        Number of batches loaded in advance by each worker. No effect if
+        ``num_workers=0``.
+    preload : bool, default=False
+        Whether to load the entire corpus once into a shared-memory
+        :class:`~aidsorb.data.PCDStore` during :meth:`setup`. Dataloader
+        workers then read the point clouds zero-copy, instead of hitting the
+        filesystem. Requires the corpus to fit in RAM.
+    micro_batching : bool, default=False
+        Whether the train dataloader should spread each batch across all
+        workers, in micro-batches of ``train_batch_size // num_workers``
+        samples, instead of assigning one whole batch per worker. Reduces the
+        first-batch latency of each epoch and straggler stalls. No effect if
+        ``num_workers < 2``. See :class:`~aidsorb.data.MicroBatchLoader`.
+
+        .. warning::
+            Under DDP, requires ``shard_by_rank=True``:
+            :class:`~aidsorb.data.MicroBatchLoader` is not a
+            :class:`~torch.utils.data.DataLoader`, so ``DistributedSampler``
+            can't be injected into it and each rank would load the full
+            dataset.
+    collate_fn : callable, optional
+        ``collate_fn`` for all dataloaders. By default, an instance of
+        :class:`~aidsorb.data.Collator` is used, which pads the variable-size
+        point clouds at collation time with a single fused copy, so no
+        padding transform is required in ``{train,eval}_transform_x``.
     config_dataloaders : dict, optional
         Dictionary for configuring the :class:`~torch.utils.data.DataLoader`'s.
         This is applied to all dataloaders, i.e.
-        ``{train,validation,test}_dataloader``. For example::
+        ``{train,validation,test,predict}_dataloader``, and *takes precedence*
+        over the above dataloader options. For example::
 
             config_dataloaders = {
                 'pin_memory': True,
@@ -95,19 +170,32 @@ class PCDDataModule(L.LightningDataModule):
     --------
     :class:`~aidsorb.data.PCDDataset`
     :class:`~torch.utils.data.DataLoader` :
-        For a description of ``shuffle``, ``batch_size`` and valid ``**kwargs``
-        passed to ``config_dataloaders``.
+        For a description of ``shuffle``, ``batch_size``, ``num_workers``,
+        ``pin_memory``, ``persistent_workers``, ``prefetch_factor`` and valid
+        ``**kwargs`` passed to ``config_dataloaders``.
     """
     def __init__(
             self, path_to_X: str, path_to_Y: str,
             index_col: str, labels: list,
             train_size: int=None,
             train_transform_x: Callable=None,
+            train_transform_batch: Callable=None,
             eval_transform_x: Callable=None,
             transform_y: Callable=None,
+            dtype: torch.dtype=torch.float,
             shuffle: bool=False,
+            seed: int=None,
+            drop_last: bool=True,
+            shard_by_rank: bool=False,
             train_batch_size: int=32,
             eval_batch_size: int=32,
+            num_workers: int=(os.cpu_count() or 2) // 2,
+            pin_memory: bool=True,
+            persistent_workers: bool=True,
+            prefetch_factor: int=2,
+            preload: bool=False,
+            micro_batching: bool=False,
+            collate_fn: Callable=None,
             config_dataloaders=None,
             ):
         super().__init__()
@@ -119,55 +207,165 @@ class PCDDataModule(L.LightningDataModule):
         self.labels = labels
 
         self.train_transform_x = train_transform_x
+        self.train_transform_batch = train_transform_batch
         self.eval_transform_x = eval_transform_x
         self.transform_y = transform_y
+        self.dtype = dtype
 
         self.train_size = train_size
         self.shuffle = shuffle
+        self.seed = seed
+        self.drop_last = drop_last
+        self.shard_by_rank = shard_by_rank
 
         self.train_batch_size = train_batch_size
         self.eval_batch_size = eval_batch_size
 
+        self.num_workers = num_workers
+        self.pin_memory = pin_memory
+        self.persistent_workers = persistent_workers
+        self.prefetch_factor = prefetch_factor
+        self.preload = preload
+        self.micro_batching = micro_batching
+
+        if collate_fn is None:
+            self.collate_fn = Collator()
+        else:
+            self.collate_fn = collate_fn
+
         if config_dataloaders is None:
             self.config_dataloaders = {}
         else:
             self.config_dataloaders = config_dataloaders
 
-        self._path_to_names = Path(self.path_to_X).parent
+        # Precompute the paths to the name lists once.
+        path_to_names = Path(self.path_to_X).parent
+        self._train_json = str(path_to_names / 'train.json')
+        self._val_json = str(path_to_names / 'validation.json')
+        self._test_json = str(path_to_names / 'test.json')
+
+    def prepare_data(self):
+        r"""
+        Create a flat copy of the point clouds for fast sequential access.
+
+        The flat copy is created alongside ``path_to_X`` and is picked up
+        automatically by the datasets. If a copy at least as recent as
+        ``path_to_X`` already exists, this method is a no-op; a stale copy
+        (e.g. the archive was regenerated) is rebuilt.
+
+        See Also
+        --------
+        :func:`aidsorb.data.flatten_npz`
+        """
+        if not _flat_is_fresh(self.path_to_X):
+            flatten_npz(self.path_to_X)
 
     def setup(self, stage=None):
         r"""
         Setup train, validation and test datasets.
+
+        Name lists and datasets are created only once, so re-entry on stage
+        transitions (e.g. ``fit -> validate -> test``) doesn't pay for
+        redundant disk reads and dataset construction.
         """
-        if stage in (None, 'fit'):
-            # Load the names for training and validation.
-            self._train_names = get_names(
-                    os.path.join(self._path_to_names, 'train.json')
-                    )[:self.train_size]  # Set the training set size.
-
-            self._val_names = get_names(
-                    os.path.join(self._path_to_names, 'validation.json')
-                    )
+        # Scan the .npz file only once and share the index across datasets.
+        if not hasattr(self, '_index'):
+            self._index = build_npz_index(self.path_to_X)
+
+        # Load the corpus once; workers then read it zero-copy.
+        if not hasattr(self, '_store'):
+            self._store = PCDStore(self.path_to_X) if self.preload else None
+
+        if stage in (None, 'fit') and not hasattr(self, 'train_dataset'):
+            # Load the names for training.
+            self._train_names = self._maybe_shard(
+                    get_names(self._train_json)[:self.train_size]
+                    )  # Set the training set size.
 
             self.set_train_dataset()
-            self.set_validation_dataset()
 
-        if stage in (None, 'validate'):
+        if stage in (None, 'fit', 'validate') and not hasattr(self, 'validation_dataset'):
             # Load the names for validation.
-            self._val_names = get_names(
-                    os.path.join(self._path_to_names, 'validation.json')
-                    )
+            self._val_names = self._maybe_shard(get_names(self._val_json))
 
             self.set_validation_dataset()
 
-        if stage in (None, 'test'):
+        if stage in (None, 'test', 'predict') and not hasattr(self, 'test_dataset'):
             # Load the names for testing.
-            self._test_names = get_names(
-                    os.path.join(self._path_to_names, 'test.json')
-                    )
+            self._test_names = self._maybe_shard(get_names(self._test_json))
 
             self.set_test_dataset()
 
+    def _rank_info(self):
+        r"""
+        Return ``(global_rank, world_size)``, accounting for the case where
+        the datamodule is not attached to a trainer.
+        """
+        if self.trainer is not None:
+            return self.trainer.global_rank, self.trainer.world_size
+
+        return 0, 1
+
+    def _maybe_shard(self, names):
+        r"""
+        Return the per-rank shard of ``names`` if ``shard_by_rank=True``,
+        otherwise return ``names`` unchanged.
+        """
+        global_rank, world_size = self._rank_info()
+
+        if self.shard_by_rank and world_size > 1:
+            return names[global_rank::world_size]
+
+        return names
+
+    def on_after_batch_transfer(self, batch, dataloader_idx):
+        r"""
+        Apply ``train_transform_batch`` to the input batch.
+
+        Runs after the batch has been moved to the training device and only
+        during training, so batch-level augmentations execute on the device
+        instead of per-sample in the CPU workers.
+        """
+        if (
+                self.train_transform_batch is not None
+                and self.trainer is not None
+                and self.trainer.training
+                ):
+            x, y = batch
+            batch = (self.train_transform_batch(x), y)
+
+        return batch
+
+    def _get_config_dataloaders(self):
+        r"""
+        Return the keyword arguments shared by all dataloaders.
+
+        Options passed with ``config_dataloaders`` take precedence.
+        """
+        config = {
+                'num_workers': self.num_workers,
+                'pin_memory': self.pin_memory,
+                'collate_fn': self.collate_fn,
+                }
+
+        # PyTorch raises if these are passed with num_workers=0, so honor a
+        # num_workers override from config_dataloaders.
+        num_workers = self.config_dataloaders.get('num_workers', self.num_workers)
+
+        if num_workers > 0:
+            config['persistent_workers'] = self.persistent_workers
+            config['prefetch_factor'] = self.prefetch_factor
+
+        # Pin directly for the local device, skipping the fallback copy
+        # through pageable memory.
+        if self.pin_memory and torch.cuda.is_available():
+            local_rank = self.trainer.local_rank if self.trainer else 0
+            config['pin_memory_device'] = f'cuda:{local_rank}'
+
+        config.update(self.config_dataloaders)
+
+        return config
+
     @property
     def train_names(self):
         r"""The names of point clouds used for training."""
@@ -193,6 +391,9 @@ class PCDDataModule(L.LightningDataModule):
                 labels=self.labels,
                 transform_x=self.train_transform_x,
                 transform_y=self.transform_y,
+                index=self._index,
+                dtype=self.dtype,
+                store=self._store,
                 )
 
     def set_validation_dataset(self):
@@ -205,6 +406,9 @@ class PCDDataModule(L.LightningDataModule):
                 labels=self.labels,
                 transform_x=self.eval_transform_x,
                 transform_y=self.transform_y,
+                index=self._index,
+                dtype=self.dtype,
+                store=self._store,
                 )
 
     def set_test_dataset(self):
@@ -217,6 +421,9 @@ class PCDDataModule(L.LightningDataModule):
                 labels=self.labels,
                 transform_x=self.eval_transform_x,
                 transform_y=self.transform_y,
+                index=self._index,
+                dtype=self.dtype,
+                store=self._store,
                 )
 
     def train_dataloader(self):
@@ -226,11 +433,57 @@ class PCDDataModule(L.LightningDataModule):
         Can be called only after :meth:`setup` has been called and
         ``stage={None|fit}``.
         """
+        sampler = None
+
+        if self.shuffle:
+            # With a fixed seed, each rank shuffles its local shard with a
+            # different one; otherwise the global RNG is used.
+            seed = self.seed
+            if seed is not None:
+                global_rank, _ = self._rank_info()
+                seed += global_rank
+
+            sampler = PermutationSampler(self.train_dataset, seed=seed)
+
+        config = self._get_config_dataloaders()
+        num_workers = config['num_workers']
+
+        if self.micro_batching and num_workers > 1:
+            # MicroBatchLoader is not a DataLoader, so Lightning can't inject
+            # its DistributedSampler: without shard_by_rank, every rank would
+            # silently iterate the full dataset.
+            _, world_size = self._rank_info()
+            if world_size > 1 and not self.shard_by_rank:
+                raise RuntimeError(
+                        'micro_batching=True requires shard_by_rank=True '
+                        'under DDP, otherwise each rank loads the full '
+                        'dataset.'
+                        )
+
+            # Spread each batch across all workers; the full batches are
+            # re-assembled (and collated) in the main process.
+            collate_fn = config.pop('collate_fn')
+            micro_batch_size = max(1, self.train_batch_size // num_workers)
+
+            return MicroBatchLoader(
+                    DataLoader(
+                        dataset=self.train_dataset,
+                        batch_size=micro_batch_size,
+                        sampler=sampler,
+                        collate_fn=_identity_collate,
+                        **config,
+                        ),
+                    batch_size=self.train_batch_size,
+                    collate_fn=collate_fn,
+                    drop_last=self.drop_last,
+                    )
+
         return DataLoader(
                 dataset=self.train_dataset,
                 batch_size=self.train_batch_size,
-                shuffle=self.shuffle,
-                **self.config_dataloaders,
+                sampler=sampler,
+                drop_last=self.drop_last,
+                **config,
                 )
 
     def val_dataloader(self):
@@ -244,7 +497,7 @@ class PCDDataModule(L.LightningDataModule):
                 dataset=self.validation_dataset,
                 batch_size=self.eval_batch_size,
                 shuffle=False,
-                **self.config_dataloaders,
+                **self._get_config_dataloaders(),
                 )
 
     def test_dataloader(self):
@@ -258,5 +511,21 @@ class PCDDataModule(L.LightningDataModule):
                 dataset=self.test_dataset,
                 batch_size=self.eval_batch_size,
                 shuffle=False,
-                **self.config_dataloaders,
+                **self._get_config_dataloaders(),
+                )
+
+    def predict_dataloader(self):
+        r"""
+        Return the predict dataloader.
+
+        The predict dataloader loads the test dataset.
+
+        Can be called only after :meth:`setup` has been called and
+        ``stage={None|predict}``.
+        """
+        return DataLoader(
+                dataset=self.test_dataset,
+                batch_size=self.eval_batch_size,
+                shuffle=False,
+                **self._get_config_dataloaders(),
                 )
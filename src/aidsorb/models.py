@@ -118,6 +118,11 @@ class PointNet(torch.nn.Module):
         out : tensor
             The output of ``head``.
         """
+        # Upcast once per batch, e.g. when the dataloader serves reduced
+        # precision for bandwidth (see aidsorb.data.PCDDataset).
+        if x.dtype != torch.float:
+            x = x.float()
+
         feats, _ = self.backbone(x)  # Ignore critical indices.
         out = self.head(feats)
 
@@ -162,6 +162,47 @@ class Identity():
         return pcd
 
 
+class Compose():
+    r"""
+    Compose several transforms into a single callable.
+
+    Prefer this over chaining transforms by hand (e.g. with nested lambdas):
+    the whole chain is applied with one call from the dataloader's hot loop
+    and the composed object can be pickled, so it is safe to use with
+    ``num_workers > 0``.
+
+    Parameters
+    ----------
+    transforms : sequence of callables
+        The transforms to be applied, *in the given order*.
+
+    Examples
+    --------
+    >>> pcd = np.random.randn(25, 4)
+    >>> tfm = Compose([Center(), Jitter(std=0.05)])
+    >>> tfm(pcd).shape
+    (25, 4)
+
+    >>> # Composing identities leaves the point cloud unchanged.
+    >>> identity = Compose([Identity(), Identity()])
+    >>> np.array_equal(identity(pcd), pcd)
+    True
+
+    >>> # Transforms are applied in order.
+    >>> tfm = Compose([Center(), RandomErase(n_points=5)])
+    >>> tfm(pcd).shape
+    (20, 4)
+    """
+    def __init__(self, transforms):
+        self.transforms = tuple(transforms)
+
+    def __call__(self, pcd):
+        for tfm in self.transforms:
+            pcd = tfm(pcd)
+
+        return pcd
+
+
 class RandomRotation():
     r"""
     Randomly rotate the coordinates of a point cloud.
@@ -123,7 +123,7 @@ def pcd_from_file(filename, features=None):
     return  name, pcd
 
 
-def pcd_from_files(filenames, outname, features=None):
+def pcd_from_files(filenames, outname, features=None, compress=True):
     r"""
     Create molecular point clouds from a list of files and store them.
 
@@ -139,10 +139,18 @@ def pcd_from_files(filenames, outname, features=None):
         Filename where the data will be stored.
     features: list, optional
         See :func:`pcd_from_file`.
+    compress : bool, default=True
+        Whether to compress the stored point clouds. Uncompressed archives
+        occupy more disk space but can be memory-mapped, see
+        :func:`aidsorb.data.build_npz_index`.
 
     Notes
     -----
-    Molecules that can't be processed are omitted.
+    * Molecules that can't be processed are omitted.
+    * :func:`numpy.load` *silently ignores* ``mmap_mode`` for ``.npz`` files,
+      so the stored point clouds are always read fully. For memory-mapped
+      access, store them with ``compress=False`` or convert them with
+      :func:`aidsorb.data.flatten_npz`.
 
     Examples
     --------
@@ -166,10 +174,13 @@ def pcd_from_files(filenames, outname, features=None):
             pass
 
     # Store the point clouds.
-    np.savez_compressed(outname, **savez_dict)
+    if compress:
+        np.savez_compressed(outname, **savez_dict)
+    else:
+        np.savez(outname, **savez_dict)
 
 
-def pcd_from_dir(dirname: str, outname: str, features: list=None):
+def pcd_from_dir(dirname: str, outname: str, features: list=None, compress: bool=True):
     r"""
     Create molecular point clouds from a directory and store them.
 
@@ -184,6 +195,8 @@ def pcd_from_dir(dirname: str, outname: str, features: list=None):
         Name of the file where point clouds will be stored.
     features: list, optional
         See :func:`pcd_from_file`.
+    compress : bool, default=True
+        See :func:`pcd_from_files`.
 
     Notes
     -----
@@ -200,4 +213,4 @@ def pcd_from_dir(dirname: str, outname: str, features: list=None):
     """
     fnames = (os.path.join(dirname, f) for f in os.listdir(dirname))
 
-    pcd_from_files(fnames, outname, features)
+    pcd_from_files(fnames, outname, features, compress)
@@ -22,6 +22,7 @@ Command: python -m unittest tests.test_data
 """
 
 import os
+import mmap
 import doctest
 import unittest
 import tempfile
@@ -34,8 +35,8 @@ from aidsorb import data
 from aidsorb.utils import pcd_from_dir
 from aidsorb.transforms import Center
 from aidsorb.data import (
-        get_names, prepare_data, PCDDataset,
-        pad_pcds, Collator
+        get_names, prepare_data, build_npz_index,
+        flatten_npz, PCDDataset, PCDStore, pad_pcds, Collator
         )
 
 
@@ -75,6 +76,126 @@ class TestPrepareData(unittest.TestCase):
         self.tempdir.cleanup()
 
 
+class TestBuildNpzIndex(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory(dir='/tmp')
+        self.outname = os.path.join(self.tempdir.name, 'pcds.npz')
+
+    def test_uncompressed(self):
+        pcd_from_dir(
+                dirname='tests/structures',
+                outname=self.outname, compress=False,
+                )
+
+        index = build_npz_index(self.outname)
+        data = np.load(self.outname)
+
+        # All names must be indexed.
+        self.assertEqual(set(index), set(data.files))
+
+        # Arrays read from the memory-map must match the stored ones.
+        with open(self.outname, 'rb') as fhand:
+            mm = mmap.mmap(fhand.fileno(), 0, access=mmap.ACCESS_READ)
+
+        for name in data.files:
+            offset, shape, dtype = index[name]
+            arr = np.frombuffer(
+                    mm, dtype=dtype,
+                    count=int(np.prod(shape)), offset=offset,
+                    ).reshape(shape)
+            self.assertTrue(np.array_equal(arr, data[name]))
+
+    def test_compressed(self):
+        pcd_from_dir(dirname='tests/structures', outname=self.outname)
+
+        # Compressed archives can't be indexed.
+        self.assertIsNone(build_npz_index(self.outname))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+
+class TestFlattenNpz(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory(dir='/tmp')
+        self.outname = os.path.join(self.tempdir.name, 'pcds.npz')
+
+        pcd_from_dir(dirname='tests/structures', outname=self.outname)
+
+    def test_flatten_npz(self):
+        flatten_npz(self.outname)
+        data = np.load(self.outname)
+
+        flat = np.load(os.path.join(self.tempdir.name, 'pcds_flat.npy'))
+        offsets = np.load(os.path.join(self.tempdir.name, 'pcds_offsets.npy'))
+        names = get_names(os.path.join(self.tempdir.name, 'pcds_names.json'))
+
+        # Stored names must follow the order in the .npz file.
+        self.assertEqual(names, data.files)
+
+        # The flat slices must match the stored point clouds.
+        self.assertEqual(len(flat), sum(len(data[n]) for n in names))
+        for i, name in enumerate(names):
+            self.assertTrue(
+                    np.array_equal(flat[offsets[i]:offsets[i + 1]], data[name])
+                    )
+
+        # The flat copy must be picked up by PCDDataset.
+        dataset = PCDDataset(pcd_names=names, path_to_X=self.outname)
+        for i, name in enumerate(names):
+            self.assertTrue(torch.equal(dataset[i], torch.tensor(data[name])))
+
+    def test_stale_flat(self):
+        flatten_npz(self.outname)
+        names = np.load(self.outname).files
+
+        # Make the .npz file newer, as if the archive was regenerated.
+        now = os.path.getmtime(self.outname)
+        os.utime(self.outname, (now + 10, now + 10))
+
+        # A stale flat copy must not be used.
+        dataset = PCDDataset(pcd_names=names, path_to_X=self.outname)
+        self.assertIsNone(dataset._path_to_flat)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+
+class TestPCDStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory(dir='/tmp')
+        self.outname = os.path.join(self.tempdir.name, 'pcds.npz')
+
+        pcd_from_dir(dirname='tests/structures', outname=self.outname)
+
+    def test_pcdstore(self):
+        store = PCDStore(self.outname)
+        data = np.load(self.outname)
+
+        # The backing storage must live in shared memory.
+        self.assertTrue(store._pcds.is_shared())
+        self.assertTrue(store._offsets.is_shared())
+
+        # Stored point clouds must match the ones in the .npz file and be
+        # served read-only, so in-place transforms can't corrupt the corpus.
+        self.assertEqual(len(store), len(data.files))
+        for name in data.files:
+            self.assertTrue(np.array_equal(store[name], data[name]))
+            self.assertFalse(store[name].flags.writeable)
+
+        # A dataset backed by the store must yield the same samples.
+        dataset = PCDDataset(
+                pcd_names=data.files,
+                path_to_X=self.outname,
+                store=store,
+                )
+        for i, name in enumerate(data.files):
+            self.assertTrue(torch.equal(dataset[i], torch.tensor(data[name])))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+
 class TestPCDDataset(unittest.TestCase):
     def setUp(self):
         self.tempdir = tempfile.TemporaryDirectory(dir='/tmp')
@@ -142,6 +263,58 @@ class TestPCDDataset(unittest.TestCase):
             self.assertEqual(y.shape, (self.batch_size, len(self.labels)))
             self.assertEqual(y.dtype, torch.float)
 
+    def test_getitems(self):
+        dataset = PCDDataset(
+                pcd_names=self.pcd_names,
+                path_to_X=self.path_to_X,
+                path_to_Y=self.path_to_Y,
+                index_col=self.index_col,
+                labels=self.labels,
+                transform_x=self.transform_x,
+                transform_y=self.transform_y
+                )
+
+        indices = list(range(len(dataset)))
+        samples = dataset.__getitems__(indices)
+
+        # Batch fetching must be equivalent to per-sample fetching.
+        self.assertEqual(len(samples), len(dataset))
+        for i, (sample_x, sample_y) in enumerate(samples):
+            x, y = dataset[i]
+            self.assertTrue(torch.equal(sample_x, x))
+            self.assertTrue(torch.equal(sample_y, y))
+
+    def test_dtype(self):
+        X = np.load(self.outname)
+
+        dataset = PCDDataset(
+                pcd_names=self.pcd_names,
+                path_to_X=self.path_to_X,
+                dtype=torch.bfloat16,
+                )
+
+        for i, name in enumerate(self.pcd_names):
+            sample_x = dataset[i]
+            self.assertEqual(sample_x.dtype, torch.bfloat16)
+
+            # Atomic numbers are exactly representable in bfloat16.
+            self.assertTrue(torch.equal(
+                sample_x[:, 3].float(),
+                torch.tensor(X[name][:, 3]),
+                ))
+
+    def test_indexed_pcddataset(self):
+        # Uncompressed archives are served from a memory-map.
+        outname = os.path.join(self.tempdir.name, 'pcds_uncompressed.npz')
+        pcd_from_dir(dirname='tests/structures', outname=outname, compress=False)
+
+        dataset = PCDDataset(pcd_names=self.pcd_names, path_to_X=outname)
+        self.assertIsNotNone(dataset.index)
+
+        X = np.load(self.outname)
+        for i, name in enumerate(self.pcd_names):
+            self.assertTrue(torch.equal(dataset[i], torch.tensor(X[name])))
+
     def test_unlabeled_pcddataset(self):
         X = np.load(self.outname)
 
@@ -25,9 +25,12 @@ import os
 import unittest
 import tempfile
 from itertools import combinations
-from torch.utils.data import RandomSampler, SequentialSampler
+import torch
+from torch.utils.data import SequentialSampler
 from aidsorb.utils import pcd_from_dir
-from aidsorb.data import prepare_data, Collator
+from aidsorb.data import (
+        prepare_data, Collator, MicroBatchLoader, PermutationSampler,
+        )
 from aidsorb.transforms import Center, RandomRotation
 from aidsorb.datamodules import PCDDataModule
 
@@ -66,6 +69,8 @@ class TestPCDDataModule(unittest.TestCase):
                 eval_transform_x=self.eval_trans_x,
                 transform_y=self.trans_y,
                 shuffle=self.shuffle,
+                # The train split is smaller than the batch size.
+                drop_last=False,
                 train_batch_size=self.train_bs,
                 eval_batch_size=self.eval_bs,
                 config_dataloaders=self.config_dataloaders,
@@ -102,6 +107,213 @@ class TestPCDDataModule(unittest.TestCase):
             self.assertIs(ds.transform_y, self.trans_y)
 
 
+    def test_micro_batching(self):
+        dm = PCDDataModule(
+                path_to_X=self.outname,
+                path_to_Y='tests/dummy/toy_dataset.csv',
+                index_col='id',
+                labels=['y2', 'y3'],
+                shuffle=True,
+                drop_last=False,
+                train_batch_size=2,
+                num_workers=2,
+                micro_batching=True,
+                )
+        dm.setup()
+
+        dl = dm.train_dataloader()
+        self.assertIsInstance(dl, MicroBatchLoader)
+
+        # Full batches must be re-assembled from the micro-batches.
+        batches = list(dl)
+        self.assertEqual(len(batches), len(dl))
+        self.assertEqual(
+                [len(x) for x, _ in batches],
+                [2, len(dm.train_dataset) - 2],
+                )
+        for x, y in batches:
+            self.assertEqual(x.ndim, 3)
+            self.assertEqual(y.ndim, 2)
+
+    def test_micro_batching_requires_sharding(self):
+        dm = PCDDataModule(
+                path_to_X=self.outname,
+                path_to_Y='tests/dummy/toy_dataset.csv',
+                index_col='id',
+                labels=['y2', 'y3'],
+                num_workers=2,
+                micro_batching=True,
+                )
+
+        class FakeTrainer:
+            global_rank = 0
+            world_size = 2
+
+        dm.trainer = FakeTrainer()
+        dm.setup()
+
+        # Under DDP, each rank would silently load the full dataset.
+        with self.assertRaises(RuntimeError):
+            dm.train_dataloader()
+
+    def test_num_workers_override(self):
+        dm = PCDDataModule(
+                path_to_X=self.outname,
+                path_to_Y='tests/dummy/toy_dataset.csv',
+                index_col='id',
+                labels=['y2', 'y3'],
+                drop_last=False,
+                config_dataloaders={'num_workers': 0},
+                )
+        dm.setup()
+
+        # Worker-only options must not be passed when workers are disabled
+        # through config_dataloaders.
+        dl = dm.train_dataloader()
+        self.assertEqual(dl.num_workers, 0)
+        next(iter(dl))
+
+    def test_train_transform_batch(self):
+        dm = PCDDataModule(
+                path_to_X=self.outname,
+                path_to_Y='tests/dummy/toy_dataset.csv',
+                index_col='id',
+                labels=['y2', 'y3'],
+                train_transform_batch=torch.zeros_like,
+                drop_last=False,
+                num_workers=0,
+                )
+        dm.setup()
+
+        batch = next(iter(dm.train_dataloader()))
+
+        class FakeTrainer:
+            training = True
+
+        # The batch transform must be applied only during training.
+        dm.trainer = FakeTrainer()
+        x, y = dm.on_after_batch_transfer(batch, 0)
+        self.assertTrue(torch.equal(x, torch.zeros_like(batch[0])))
+        self.assertTrue(torch.equal(y, batch[1]))
+
+        dm.trainer.training = False
+        x, y = dm.on_after_batch_transfer(batch, 0)
+        self.assertTrue(torch.equal(x, batch[0]))
+
+    def test_default_collate_fn(self):
+        dm = PCDDataModule(
+                path_to_X=self.outname,
+                path_to_Y='tests/dummy/toy_dataset.csv',
+                index_col='id',
+                labels=['y2', 'y3'],
+                drop_last=False,
+                num_workers=0,
+                )
+        dm.setup()
+
+        # Variable size point clouds must be batched out of the box.
+        dl = dm.train_dataloader()
+        self.assertIsInstance(dl.collate_fn, Collator)
+
+        x, y = next(iter(dl))
+        self.assertEqual(x.ndim, 3)
+        self.assertEqual(y.ndim, 2)
+
+    def test_shard_by_rank(self):
+        kwargs = {
+                'path_to_X': self.outname,
+                'path_to_Y': 'tests/dummy/toy_dataset.csv',
+                'index_col': 'id',
+                'labels': ['y2', 'y3'],
+                }
+
+        full = PCDDataModule(**kwargs)
+        full.setup()
+
+        class FakeTrainer:
+            global_rank = 1
+            world_size = 2
+
+        sharded = PCDDataModule(shard_by_rank=True, **kwargs)
+        sharded.trainer = FakeTrainer()
+        sharded.setup()
+
+        # Each rank must hold only its own shard of the names.
+        self.assertEqual(sharded.train_names, full.train_names[1::2])
+        self.assertEqual(sharded.val_names, full.val_names[1::2])
+        self.assertEqual(sharded.test_names, full.test_names[1::2])
+
+    def test_seed(self):
+        kwargs = {
+                'path_to_X': self.outname,
+                'path_to_Y': 'tests/dummy/toy_dataset.csv',
+                'index_col': 'id',
+                'labels': ['y2', 'y3'],
+                'shuffle': True,
+                'num_workers': 0,
+                }
+
+        def order(dm):
+            return torch.stack(list(dm.train_dataloader().sampler))
+
+        # A fixed seed must give the same shuffle order across runs.
+        seeded = []
+        for _ in range(2):
+            dm = PCDDataModule(seed=42, **kwargs)
+            dm.setup()
+            seeded.append(order(dm))
+        self.assertTrue(torch.equal(*seeded))
+
+        # By default, the shuffle order must follow the global RNG.
+        dm = PCDDataModule(**kwargs)
+        dm.setup()
+
+        torch.manual_seed(0)
+        epoch1 = order(dm)
+        torch.manual_seed(0)
+        epoch2 = order(dm)
+        self.assertTrue(torch.equal(epoch1, epoch2))
+
+    def test_drop_last(self):
+        dm = PCDDataModule(
+                path_to_X=self.outname,
+                path_to_Y='tests/dummy/toy_dataset.csv',
+                index_col='id',
+                labels=['y2', 'y3'],
+                train_batch_size=2,
+                eval_batch_size=2,
+                num_workers=0,
+                )
+        dm.setup()
+
+        # By default, the ragged final batch is dropped during training...
+        self.assertTrue(dm.train_dataloader().drop_last)
+        self.assertEqual(
+                [len(x) for x, _ in dm.train_dataloader()],
+                [2],
+                )
+
+        # ...but kept during evaluation.
+        self.assertEqual(
+                [len(x) for x, _ in dm.val_dataloader()],
+                [len(dm.validation_dataset)],
+                )
+
+    def test_setup_is_memoized(self):
+        datasets = (
+                self.dm.train_dataset,
+                self.dm.validation_dataset,
+                self.dm.test_dataset,
+                )
+
+        # Re-entry on stage transitions must not rebuild the datasets.
+        for stage in ('fit', 'validate', 'test', None):
+            self.dm.setup(stage)
+
+        self.assertIs(self.dm.train_dataset, datasets[0])
+        self.assertIs(self.dm.validation_dataset, datasets[1])
+        self.assertIs(self.dm.test_dataset, datasets[2])
+
     def test_dataloaders(self):
         dataloaders = [
                 self.dm.train_dataloader(),
@@ -119,7 +331,7 @@ class TestPCDDataModule(unittest.TestCase):
         for i, dl in enumerate(dataloaders):
             # Check that dataloaders use appropriate settings.
             if i == 0:
-                self.assertIsInstance(dl.sampler, RandomSampler)
+                self.assertIsInstance(dl.sampler, PermutationSampler)
                 self.assertEqual(dl.batch_size, self.train_bs)
             else:
                 self.assertIsInstance(dl.sampler, SequentialSampler)
@@ -70,15 +70,18 @@ class TestPCDFromFiles(unittest.TestCase):
         # Stored names must follow the order in self.names.
         self.assertEqual(data.files, self.names)
 
+        # Materialize each pcd once instead of per assertion.
+        irmof, cubtc = data['IRMOF-1'], data['Cu-BTC']
+
         # Point cloud of IRMOF-1 should include Zinc (Z=30).
-        self.assertTrue(30 in data['IRMOF-1'][:, -1])
+        self.assertTrue(bool(np.any(irmof[:, -1] == 30)))
 
         # Point cloud of Cu-BTC should include Copper (Z=29).
-        self.assertTrue(29 in data['Cu-BTC'][:, -1])
+        self.assertTrue(bool(np.any(cubtc[:, -1] == 29)))
 
         # Check that pcds have the correct shape.
-        self.assertEqual(data['IRMOF-1'].shape, (424, 4))
-        self.assertEqual(data['Cu-BTC'].shape, (624, 4))
+        self.assertEqual(irmof.shape, (424, 4))
+        self.assertEqual(cubtc.shape, (624, 4))
 
     def tearDown(self):
         self.tempdir.cleanup()